@@ -4,8 +4,12 @@ import numpy as np
 import logging
 from typing import Dict, List, Tuple, Optional, Any
 import hashlib
+import io
 from dataclasses import dataclass
 import math
+import html
+import gc
+import importlib.util
 
 # ログ設定
 logging.basicConfig(level=logging.INFO)
@@ -30,6 +34,7 @@ class AppConfig:
     ITEMS_PER_PAGE_MOBILE: int = 20
     ITEMS_PER_PAGE_TABLET: int = 50
     ITEMS_PER_PAGE_DESKTOP: int = 100
+    NATIVE_DATAFRAME_LIMIT: int = 1000  # この件数以下はページングせずに全件表示
     
     # UI設定
     DANGEROUS_CHARS: List[str] = None
@@ -66,19 +71,7 @@ class AppConfig:
                 "Shift_JIS": "shift_jis"
             }
 
-@dataclass
-class ComparisonItem:
-    """比較結果アイテム"""
-    type: str
-    data: Dict[str, Any]
-    stock1: float
-    stock2: float
-    stock1_display: str
-    stock2_display: str
-    stock_change: float
-    key: str
-
-@dataclass
+@dataclass(slots=True)
 class ComparisonSummary:
     """比較結果サマリー"""
     added: int = 0
@@ -90,9 +83,30 @@ class ComparisonSummary:
     def total_items(self) -> int:
         return self.added + self.deleted + self.modified + self.unchanged
 
+class ResultColumn:
+    """比較結果DataFrameの内部列名（元データの列名と衝突しないよう予約名を使用）"""
+    TYPE = "__type__"
+    STOCK1 = "__stock1__"
+    STOCK2 = "__stock2__"
+    STOCK1_DISPLAY = "__stock1_display__"
+    STOCK2_DISPLAY = "__stock2_display__"
+    STOCK_CHANGE = "__stock_change__"
+    KEY = "__key__"
+    STOCK1_FMT = "__stock1_fmt__"
+    STOCK2_FMT = "__stock2_fmt__"
+    CHANGE_FMT = "__change_fmt__"
+    
+    ALL = (
+        TYPE, STOCK1, STOCK2, STOCK1_DISPLAY, STOCK2_DISPLAY, STOCK_CHANGE, KEY,
+        STOCK1_FMT, STOCK2_FMT, CHANGE_FMT
+    )
+
 # グローバル設定インスタンス
 CONFIG = AppConfig()
 
+# Excel読み込みエンジン（python-calamine があれば高速なcalamineを使用し、なければpandasの既定に任せる）
+EXCEL_ENGINE: Optional[str] = "calamine" if importlib.util.find_spec("python_calamine") else None
+
 # =============================================================================
 # セッション管理
 # =============================================================================
@@ -103,6 +117,8 @@ class SessionState:
     # セッションキー定数
     COMPARISON_COMPLETED = "comparison_completed"
     ALL_ITEMS = "all_items"
+    TYPE_INDICES = "type_indices"
+    CSV_CACHE = "csv_cache"
     SUMMARY = "summary"
     ORIGINAL_COLUMNS = "original_columns"
     FILE1_NAME = "file1_name"
@@ -127,7 +143,7 @@ class SessionState:
     def clear_comparison_data(cls):
         """比較データをクリア"""
         keys_to_clear = [
-            cls.COMPARISON_COMPLETED, cls.ALL_ITEMS, cls.SUMMARY, cls.ORIGINAL_COLUMNS,
+            cls.COMPARISON_COMPLETED, cls.ALL_ITEMS, cls.TYPE_INDICES, cls.CSV_CACHE, cls.SUMMARY, cls.ORIGINAL_COLUMNS,
             cls.FILE1_NAME, cls.FILE1_SHEET, cls.FILE2_NAME, cls.FILE2_SHEET
         ]
         
@@ -136,12 +152,14 @@ class SessionState:
                 del st.session_state[key]
     
     @classmethod
-    def save_comparison_result(cls, items: List[ComparisonItem], summary: ComparisonSummary,
+    def save_comparison_result(cls, items: pd.DataFrame, summary: ComparisonSummary,
                              columns: List[str], file1_name: str, file1_sheet: str,
                              file2_name: str, file2_sheet: str):
         """比較結果を保存"""
         st.session_state.update({
             cls.ALL_ITEMS: items,
+            cls.TYPE_INDICES: build_type_indices(items),
+            cls.CSV_CACHE: {},
             cls.SUMMARY: summary,
             cls.ORIGINAL_COLUMNS: columns,
             cls.COMPARISON_COMPLETED: True,
@@ -159,9 +177,10 @@ def get_device_type() -> str:
     """現在のデバイスタイプを取得"""
     return st.session_state.get(SessionState.DEVICE_TYPE, 'desktop')
 
-def get_items_per_page() -> int:
+def get_items_per_page(device_type: str = None) -> int:
     """デバイスタイプに応じたページあたりアイテム数を取得"""
-    device_type = get_device_type()
+    if device_type is None:
+        device_type = get_device_type()
     
     if device_type == 'mobile':
         return CONFIG.ITEMS_PER_PAGE_MOBILE
@@ -203,25 +222,41 @@ def parse_stock_value(value: Any) -> Tuple[float, str]:
     except (ValueError, TypeError):
         return 0.0, original_value
 
-def format_stock_display(item: ComparisonItem) -> Tuple[str, str, str]:
-    """在庫表示値をフォーマット"""
-    if item.type == 'added':
-        stock1_display = ""
-        stock2_display = item.stock2_display if item.stock2_display == "●" else f"{item.stock2:.0f}"
-        stock_change_display = ""
-    elif item.type == 'deleted':
-        stock1_display = item.stock1_display if item.stock1_display == "●" else f"{item.stock1:.0f}"
-        stock2_display = ""
-        stock_change_display = ""
-    else:  # modified, unchanged
-        stock1_display = item.stock1_display if item.stock1_display == "●" else f"{item.stock1:.0f}"
-        stock2_display = item.stock2_display if item.stock2_display == "●" else f"{item.stock2:.0f}"
-        
-        # 在庫変化の表示
-        if item.stock1_display == "●" or item.stock2_display == "●":
-            stock_change_display = ""
-        else:
-            stock_change_display = f"{item.stock_change:+.0f}"
+def parse_stock_series(values: pd.Series) -> Tuple[pd.Series, pd.Series]:
+    """在庫値の列を一括解析（parse_stock_value の列版、数値と表示値を返す）"""
+    display = values.fillna("").astype(str).str.strip()
+    
+    # ASCIIの数字・ドット以外を除去して一括変換
+    cleaned = display.str.replace(r"[\x00-\x2d\x2f\x3a-\x7f]+", "", regex=True)
+    numeric = pd.to_numeric(cleaned, errors="coerce").astype(float)
+    
+    # 全角数字などASCII以外を含む値のみ従来の解析にフォールバック
+    fallback = numeric.isna() & (cleaned != "")
+    if fallback.any():
+        numeric.loc[fallback] = display[fallback].map(lambda value: parse_stock_value(value)[0])
+    
+    return numeric.fillna(0.0).mask(display == "●", 0.0), display
+
+def format_stock_display_bulk(items: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """比較結果DataFrameの在庫表示値を一括フォーマット"""
+    item_types = items[ResultColumn.TYPE].to_numpy()
+    is_added = item_types == 'added'
+    is_deleted = item_types == 'deleted'
+    is_dot1 = items[ResultColumn.STOCK1_DISPLAY].to_numpy() == "●"
+    is_dot2 = items[ResultColumn.STOCK2_DISPLAY].to_numpy() == "●"
+    
+    stock1_display = np.select(
+        [is_added, is_dot1], ["", "●"],
+        default=np.char.mod("%.0f", items[ResultColumn.STOCK1].to_numpy())
+    )
+    stock2_display = np.select(
+        [is_deleted, is_dot2], ["", "●"],
+        default=np.char.mod("%.0f", items[ResultColumn.STOCK2].to_numpy())
+    )
+    stock_change_display = np.select(
+        [is_added | is_deleted | is_dot1 | is_dot2], [""],
+        default=np.char.mod("%+.0f", items[ResultColumn.STOCK_CHANGE].to_numpy())
+    )
     
     return stock1_display, stock2_display, stock_change_display
 
@@ -235,15 +270,22 @@ def get_page_info(total_items: int, items_per_page: int = None) -> Tuple[int, in
     
     return total_pages, max_page, items_per_page, total_items
 
-def get_page_items(items: List[Any], page: int, items_per_page: int = None) -> List[Any]:
-    """指定ページのアイテムを取得"""
+def get_page_items(items, page: int, items_per_page: int = None):
+    """指定ページの行を取得（DataFrame・行位置配列のいずれも可）"""
     if items_per_page is None:
         items_per_page = get_items_per_page()
     
     start_idx = (page - 1) * items_per_page
     end_idx = start_idx + items_per_page
+    if isinstance(items, (pd.DataFrame, pd.Series)):
+        return items.iloc[start_idx:end_idx]
     return items[start_idx:end_idx]
 
+def build_type_indices(items: pd.DataFrame) -> Dict[str, np.ndarray]:
+    """変更タイプごとの行位置を作成（タブ表示時の絞り込み用）"""
+    types = items[ResultColumn.TYPE].to_numpy()
+    return {change_type: np.flatnonzero(types == change_type) for change_type in CONFIG.TYPE_DISPLAY_MAP}
+
 def get_page_range(total_items: int, page: int, items_per_page: int = None) -> Tuple[int, int]:
     """現在ページの表示範囲を取得"""
     if items_per_page is None:
@@ -257,6 +299,39 @@ def get_page_range(total_items: int, page: int, items_per_page: int = None) -> T
 # ファイル処理
 # =============================================================================
 
+def _file_digest(file_bytes: bytes) -> str:
+    """キャッシュキー用のファイル内容ダイジェスト"""
+    return hashlib.blake2b(file_bytes, digest_size=16).hexdigest()
+
+def get_file_digest(uploaded_file, file_identifier: str) -> str:
+    """アップロードファイルのダイジェスト取得（同じアップロードは再計算しない）"""
+    state_key = f"_file_digest_{file_identifier}"
+    cached = st.session_state.get(state_key)
+    
+    if cached is None or cached[0] != uploaded_file.file_id:
+        cached = (uploaded_file.file_id, _file_digest(uploaded_file.getvalue()))
+        st.session_state[state_key] = cached
+    
+    return cached[1]
+
+@st.cache_data(show_spinner=False, max_entries=4)
+def _list_sheets(file_digest: str, _file_bytes: bytes) -> List[str]:
+    """シート名一覧取得（同じファイル内容はキャッシュを利用）"""
+    with pd.ExcelFile(io.BytesIO(_file_bytes), engine=EXCEL_ENGINE) as excel_file:
+        return list(excel_file.sheet_names)
+
+@st.cache_data(show_spinner=False, max_entries=4)
+def _read_sheet(file_digest: str, sheet_name: str, _file_bytes: bytes) -> pd.DataFrame:
+    """シート読み込み（同じファイル内容・シートの再読み込みはキャッシュを利用）"""
+    data = pd.read_excel(io.BytesIO(_file_bytes), sheet_name=sheet_name, dtype=str, engine=EXCEL_ENGINE).fillna("")
+    
+    # キー列はPyArrow文字列で保持してメモリ削減・比較を高速化
+    for col in CONFIG.KEY_COLUMNS:
+        if col in data.columns:
+            data[col] = data[col].astype("string[pyarrow]")
+    
+    return data
+
 def load_excel_file(uploaded_file, file_identifier: str) -> Tuple[Optional[pd.DataFrame], str, str]:
     """Excelファイル読み込み"""
     try:
@@ -267,16 +342,18 @@ def load_excel_file(uploaded_file, file_identifier: str) -> Tuple[Optional[pd.Da
             return None, "", ""
         
         # Excelファイル読み込み
-        excel_file = pd.ExcelFile(uploaded_file)
-        if not excel_file.sheet_names:
+        file_bytes = uploaded_file.getvalue()
+        file_digest = get_file_digest(uploaded_file, file_identifier)
+        sheet_names = _list_sheets(file_digest, file_bytes)
+        if not sheet_names:
             st.warning("シートが見つかりません")
             return None, "", ""
         
         # シート選択
         sheet_name = st.selectbox(
             "シートを選択",
-            excel_file.sheet_names,
-            key=f"sheet_{file_identifier}_{hashlib.md5(uploaded_file.name.encode()).hexdigest()[:8]}",
+            sheet_names,
+            key=f"sheet_{file_identifier}_{file_digest[:8]}",
             help="分析対象のシートを選択してください"
         )
         
@@ -284,7 +361,7 @@ def load_excel_file(uploaded_file, file_identifier: str) -> Tuple[Optional[pd.Da
             return None, uploaded_file.name, ""
         
         # データ読み込み
-        data = pd.read_excel(excel_file, sheet_name=sheet_name, dtype=str).fillna("")
+        data = _read_sheet(file_digest, sheet_name, file_bytes)
         
         # データサイズ制限
         if len(data) > CONFIG.MAX_DATA_ROWS:
@@ -311,6 +388,24 @@ def load_excel_file(uploaded_file, file_identifier: str) -> Tuple[Optional[pd.Da
 class InventoryComparator:
     """在庫比較エンジン"""
     
+    # 事前計算した在庫値の内部列名
+    STOCK_NUMERIC_COLUMN = "__stock_num__"
+    STOCK_DISPLAY_COLUMN = "__stock_disp__"
+    STOCK_PLAIN_COLUMN = "__stock_plain__"
+    KEY_COLUMN = ResultColumn.KEY
+    MERGE_INDICATOR_COLUMN = "__merge__"
+    
+    # 元データの列名と衝突すると比較できない内部列名
+    RESERVED_COLUMNS = frozenset(ResultColumn.ALL) | {
+        STOCK_NUMERIC_COLUMN, STOCK_DISPLAY_COLUMN, STOCK_PLAIN_COLUMN, MERGE_INDICATOR_COLUMN
+    }
+    
+    # アイテムタイプ（並び順がそのままタイプコードとなる）
+    ITEM_TYPES = ("added", "deleted", "modified", "unchanged")
+    
+    # 数値のみ（または空欄）の在庫表示値。これ以外は数値化で情報が落ちるため表示値でも比較する
+    PLAIN_STOCK_PATTERN = r"(?:[0-9]+(?:\.[0-9]+)?)?"
+    
     def __init__(self):
         self.key_columns = CONFIG.KEY_COLUMNS
         self.stock_column = CONFIG.STOCK_COLUMN
@@ -320,152 +415,194 @@ class InventoryComparator:
         if data1.empty or data2.empty:
             return False, "空のデータが含まれています"
         
-        if set(data1.columns) != set(data2.columns):
+        # 列集合は一度だけ作成して以降の判定で使い回す
+        columns1 = frozenset(data1.columns)
+        if columns1 != frozenset(data2.columns):
             return False, "列構成が異なります"
         
-        missing_keys = [key for key in self.key_columns if key not in data1.columns]
+        missing_keys = [key for key in self.key_columns if key not in columns1]
         if missing_keys:
             return False, f"必須キー列が不足: {missing_keys}"
         
-        if self.stock_column not in data1.columns:
+        if self.stock_column not in columns1:
             return False, f"比較列 '{self.stock_column}' が見つかりません"
         
+        reserved_columns = [col for col in data1.columns if col in self.RESERVED_COLUMNS]
+        if reserved_columns:
+            return False, f"内部で使用する列名は使用できません: {reserved_columns}"
+        
         return True, "OK"
     
-    def _generate_key(self, row: pd.Series) -> str:
-        """行の一意キーを生成"""
-        return "|".join([str(row.get(col, "")).strip() for col in self.key_columns])
+    def _generate_keys(self, data: pd.DataFrame) -> pd.Series:
+        """全行の一意キーを列単位で生成"""
+        key_parts = []
+        for col in self.key_columns:
+            if col not in data.columns:
+                key_parts.append(pd.Series("", index=data.index))
+                continue
+            
+            # 文字列型の列（PyArrow文字列など）は変換せずにそのまま結合
+            part = data[col]
+            if not pd.api.types.is_string_dtype(part):
+                part = part.astype(str)
+            key_parts.append(part.str.strip())
+        
+        return key_parts[0].str.cat(key_parts[1:], sep="|")
     
-    def _create_data_map(self, data: pd.DataFrame) -> Dict[str, Dict]:
-        """データをマップに変換"""
-        return {
-            self._generate_key(row): row.to_dict() 
-            for _, row in data.iterrows() 
-            if self._generate_key(row)
-        }
+    def _precompute_stock(self, data: pd.DataFrame) -> pd.DataFrame:
+        """在庫値の数値列・表示列・数値のみかどうかの判定列を一括で付与"""
+        numeric, display = parse_stock_series(data[self.stock_column])
+        return data.assign(**{
+            self.STOCK_NUMERIC_COLUMN: numeric,
+            self.STOCK_DISPLAY_COLUMN: display,
+            self.STOCK_PLAIN_COLUMN: display.str.fullmatch(self.PLAIN_STOCK_PATTERN).to_numpy(dtype=bool)
+        })
     
-    def _determine_item_type(self, row1: Optional[Dict], row2: Optional[Dict], 
-                           stock1_display: str, stock2_display: str) -> Tuple[str, Dict]:
-        """アイテムタイプを判定"""
-        if row1 and row2:
-            item_type = 'modified' if stock1_display != stock2_display else 'unchanged'
-            item_data = row2
-        elif row2 and not row1:
-            item_type = 'added'
-            item_data = row2
-        elif row1 and not row2:
-            item_type = 'deleted'
-            item_data = row1
-        else:
-            raise ValueError("Invalid row combination")
+    def _attach_key(self, data: pd.DataFrame) -> pd.DataFrame:
+        """結合キーを一度だけ生成してインデックスに設定"""
+        keys = self._generate_keys(data).rename(self.KEY_COLUMN)
+        frame = data.set_index(keys)
         
-        return item_type, item_data
+        # キー列がすべて空の行は除外し、重複キーは後の行を優先
+        frame = frame[(keys != "|" * (len(self.key_columns) - 1)).to_numpy()]
+        return frame[~frame.index.duplicated(keep="last")]
     
-    def compare(self, data1: pd.DataFrame, data2: pd.DataFrame) -> Tuple[List[ComparisonItem], ComparisonSummary]:
+    def compare(self, data1: pd.DataFrame, data2: pd.DataFrame) -> Tuple[pd.DataFrame, ComparisonSummary]:
         """在庫比較実行"""
-        # データをマップに変換
-        map1 = self._create_data_map(data1)
-        map2 = self._create_data_map(data2)
+        # キーインデックス同士で外部結合（キーの和集合・ソートもpandas内で実行）
+        merged = self._attach_key(self._precompute_stock(data1)).merge(
+            self._attach_key(self._precompute_stock(data2)),
+            left_index=True,
+            right_index=True,
+            how="outer",
+            sort=True,
+            suffixes=("_1", "_2"),
+            indicator=self.MERGE_INDICATOR_COLUMN
+        ).reset_index()
+        
+        in_file1 = merged[self.MERGE_INDICATOR_COLUMN].ne("right_only")
+        in_file2 = merged[self.MERGE_INDICATOR_COLUMN].ne("left_only")
+        stock1 = merged[f"{self.STOCK_NUMERIC_COLUMN}_1"].fillna(0.0)
+        stock2 = merged[f"{self.STOCK_NUMERIC_COLUMN}_2"].fillna(0.0)
+        stock1_display = merged[f"{self.STOCK_DISPLAY_COLUMN}_1"].fillna("")
+        stock2_display = merged[f"{self.STOCK_DISPLAY_COLUMN}_2"].fillna("")
         
-        all_keys = sorted(set(map1.keys()) | set(map2.keys()))
+        # 表示値が異なり、どちらかが数値のみでない場合（符号・単位・文字列など）は数値が同じでも変更とみなす
+        # （片側のみの行は判定列が欠損となるが、タイプ判定では追加・削除が優先される）
+        both_plain = (
+            merged[f"{self.STOCK_PLAIN_COLUMN}_1"].eq(True) & merged[f"{self.STOCK_PLAIN_COLUMN}_2"].eq(True)
+        )
+        text_differs = (stock1_display != stock2_display) & ~both_plain
         
-        items = []
-        summary = ComparisonSummary()
+        # アイテムタイプを判定（在庫数値の差、●の有無の差、または上記の表示値の差で変更とみなす）
+        stock_differs = (stock1 != stock2) | ((stock1_display == "●") != (stock2_display == "●")) | text_differs
+        # 文字列ではなく int8 のタイプコードで判定し、カテゴリ型として保持
+        type_codes = np.select(
+            [~in_file2, ~in_file1, stock_differs],
+            [1, 0, 2],
+            default=3
+        ).astype(np.int8)
+        item_types = pd.Categorical.from_codes(type_codes, categories=self.ITEM_TYPES)
         
-        for key in all_keys:
-            row1 = map1.get(key)
-            row2 = map2.get(key)
-            
-            # 在庫値を取得
-            stock1_numeric, stock1_display = (
-                parse_stock_value(row1.get(self.stock_column)) if row1 else (0.0, "")
-            )
-            stock2_numeric, stock2_display = (
-                parse_stock_value(row2.get(self.stock_column)) if row2 else (0.0, "")
-            )
-            stock_change = stock2_numeric - stock1_numeric
-            
-            try:
-                item_type, item_data = self._determine_item_type(
-                    row1, row2, stock1_display, stock2_display
-                )
-                
-                # サマリー更新
-                if item_type == 'added':
-                    summary.added += 1
-                elif item_type == 'deleted':
-                    summary.deleted += 1
-                elif item_type == 'modified':
-                    summary.modified += 1
-                else:
-                    summary.unchanged += 1
-                
-                items.append(ComparisonItem(
-                    type=item_type,
-                    data=item_data,
-                    stock1=stock1_numeric,
-                    stock2=stock2_numeric,
-                    stock1_display=stock1_display,
-                    stock2_display=stock2_display,
-                    stock_change=stock_change,
-                    key=key
-                ))
-                
-            except ValueError:
-                continue
+        # 比較先に存在する行は比較先、それ以外は比較元のデータを採用
+        item_data = pd.DataFrame({
+            col: np.where(in_file2, merged[f"{col}_2"], merged[f"{col}_1"])
+            for col in data1.columns
+        })
+        
+        # タイプ別件数をタイプコードから一括集計
+        type_counts = np.bincount(type_codes, minlength=len(self.ITEM_TYPES))
+        summary = ComparisonSummary(**dict(zip(self.ITEM_TYPES, type_counts.tolist())))
+        
+        result_df = pd.DataFrame({
+            ResultColumn.TYPE: item_types,
+            ResultColumn.STOCK1: stock1,
+            ResultColumn.STOCK2: stock2,
+            ResultColumn.STOCK1_DISPLAY: stock1_display,
+            ResultColumn.STOCK2_DISPLAY: stock2_display,
+            ResultColumn.STOCK_CHANGE: stock2 - stock1,
+            ResultColumn.KEY: merged[self.KEY_COLUMN]
+        })
         
-        return items, summary
+        # 表示用の在庫文字列は比較時に一度だけフォーマット
+        result_df[ResultColumn.STOCK1_FMT], result_df[ResultColumn.STOCK2_FMT], result_df[ResultColumn.CHANGE_FMT] = (
+            format_stock_display_bulk(result_df)
+        )
+        result_df = pd.concat([result_df, item_data], axis=1)
+        
+        return result_df, summary
+
+@st.cache_resource
+def get_comparator() -> InventoryComparator:
+    """比較エンジン取得（ユーザーデータを保持しないため全セッションで共有）"""
+    return InventoryComparator()
 
 # =============================================================================
 # CSV出力
 # =============================================================================
 
-def create_csv_data(items: List[ComparisonItem], columns: List[str], encoding_choice: str) -> bytes:
+def create_csv_data(items: pd.DataFrame, columns: List[str], encoding_choice: str) -> bytes:
     """CSV出力データ作成"""
-    if not items:
+    if items.empty:
         return b""
     
-    export_data = []
-    for item in items:
-        stock1_display, stock2_display, stock_change_display = format_stock_display(item)
-        
-        row = {
-            '変更タイプ': CONFIG.TYPE_EXPORT_MAP[item.type],
-            'ファイル1在庫': stock1_display,
-            'ファイル2在庫': stock2_display,
-            '在庫変化': stock_change_display,
-            '比較キー': item.key,
-        }
-        
-        # 元の列データを追加
-        for col in columns:
-            row[col] = item.data.get(col, '')
-        
-        export_data.append(row)
+    export_columns = {
+        '変更タイプ': items[ResultColumn.TYPE].cat.rename_categories(CONFIG.TYPE_EXPORT_MAP).array,
+        'ファイル1在庫': items[ResultColumn.STOCK1_FMT].to_numpy(),
+        'ファイル2在庫': items[ResultColumn.STOCK2_FMT].to_numpy(),
+        '在庫変化': items[ResultColumn.CHANGE_FMT].to_numpy(),
+        '比較キー': items[ResultColumn.KEY].to_numpy()
+    }
     
-    df = pd.DataFrame(export_data)
+    # 元の列データを追加（結果の列をそのまま参照し、行ごとの再構築はしない）
+    for col in columns:
+        export_columns[col] = items[col].to_numpy() if col in items.columns else ''
+    
+    # エンコード済みのバイト列を直接バッファへ書き出す
+    buffer = io.BytesIO()
     encoding = CONFIG.ENCODING_MAP.get(encoding_choice, "utf-8-sig")
-    return df.to_csv(index=False).encode(encoding)
+    pd.DataFrame(export_columns).to_csv(buffer, index=False, encoding=encoding)
+    return buffer.getvalue()
+
+def get_csv_data(encoding_choice: str) -> bytes:
+    """CSV出力データ取得（現在の比較結果について文字コードごとに一度だけ作成し、セッションに保持）"""
+    csv_cache = st.session_state.setdefault(SessionState.CSV_CACHE, {})
+    if encoding_choice not in csv_cache:
+        csv_cache[encoding_choice] = create_csv_data(
+            st.session_state[SessionState.ALL_ITEMS],
+            st.session_state[SessionState.ORIGINAL_COLUMNS],
+            encoding_choice
+        )
+    return csv_cache[encoding_choice]
 
 # =============================================================================
 # UI コンポーネント
 # =============================================================================
 
-def inject_responsive_css():
-    """レスポンシブCSS注入"""
-    st.markdown("""
+# レスポンシブCSS（再実行ごとに組み立て直さないようモジュール定数として保持）
+_RESPONSIVE_CSS = """
     <style>
+    /* テーマ変数（ダークモードでは変数のみ上書き） */
+    :root {
+        --file-info-card-bg: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
+        --pagination-bg: #f8f9fa;
+    }
+    
+    @media (prefers-color-scheme: dark) {
+        :root {
+            --file-info-card-bg: linear-gradient(135deg, #4a5568 0%, #2d3748 100%);
+            --pagination-bg: #2d3748;
+        }
+    }
+    
     /* ベースレスポンシブスタイル */
     .main > div {
         padding-top: 1rem;
-        padding-left: 1rem;
-        padding-right: 1rem;
     }
     
     /* ヘッダーレスポンシブ */
     .responsive-header {
         background: linear-gradient(90deg, #4b6cb7 0%, #182848 100%);
-        padding: 1rem;
         border-radius: 8px;
         margin-bottom: 1rem;
         text-align: center;
@@ -494,9 +631,8 @@ def inject_responsive_css():
     
     /* ファイル情報カード */
     .file-info-card {
-        background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
+        background: var(--file-info-card-bg);
         color: white;
-        padding: 1rem;
         border-radius: 8px;
         margin-bottom: 1rem;
     }
@@ -520,7 +656,7 @@ def inject_responsive_css():
         gap: 0.5rem;
         margin: 1rem 0;
         padding: 1rem;
-        background-color: #f8f9fa;
+        background-color: var(--pagination-bg);
         border-radius: 8px;
     }
     
@@ -529,7 +665,7 @@ def inject_responsive_css():
         color: #6c757d;
     }
     
-    /* モバイル最適化 */
+    /* モバイル最適化（幅で異なる指定は各ブロックで明示） */
     @media (max-width: 768px) {
         .main > div {
             padding-left: 0.5rem;
@@ -550,20 +686,52 @@ def inject_responsive_css():
         }
     }
     
-    /* ダークモード対応 */
-    @media (prefers-color-scheme: dark) {
+    /* タブレット・デスクトップ（モバイル条件の否定とし、小数幅でも隙間なく切り替える） */
+    @media not all and (max-width: 768px) {
+        .main > div {
+            padding-left: 1rem;
+            padding-right: 1rem;
+        }
+        
+        .responsive-header {
+            padding: 1rem;
+        }
+        
         .file-info-card {
-            background: linear-gradient(135deg, #4a5568 0%, #2d3748 100%);
+            padding: 1rem;
         }
         
         .pagination-container {
-            background-color: #2d3748;
+            flex-direction: row;
+            text-align: left;
         }
     }
     </style>
-    """, unsafe_allow_html=True)
+    """
+
+# ファイル情報カードのHTMLテンプレート（比較元・比較先、モバイル・デスクトップで共通）
+_FILE_INFO_CARD_TEMPLATE = (
+    '<div class="file-info-card">'
+    '<h4>📁 {title}</h4>'
+    '<p><strong>ファイル名:</strong> {file_name}</p>'
+    '<p><strong>シート:</strong> {sheet_name}</p>'
+    '</div>'
+)
+
+def inject_responsive_css():
+    """レスポンシブCSS注入"""
+    # Streamlitは再実行時に出力されなかった要素を削除するため、毎回同じ定数を出力する
+    st.markdown(_RESPONSIVE_CSS, unsafe_allow_html=True)
+
+def render_file_info_card(title: str, file_name: str, sheet_name: str) -> str:
+    """ファイル情報カードのHTML生成（ファイル名・シート名はHTMLエスケープして埋め込む）"""
+    return _FILE_INFO_CARD_TEMPLATE.format(
+        title=title,
+        file_name=html.escape(str(file_name)),
+        sheet_name=html.escape(str(sheet_name))
+    )
 
-def render_header(comparison_completed: bool):
+def render_header(comparison_completed: bool, device_type: str):
     """ヘッダー表示"""
     st.markdown("""
     <div class="responsive-header">
@@ -578,44 +746,25 @@ def render_header(comparison_completed: bool):
             SessionState.FILE2_NAME, SessionState.FILE2_SHEET
         ]
     ):
-        device_type = get_device_type()
+        file1_name = st.session_state[SessionState.FILE1_NAME]
+        file1_sheet = st.session_state[SessionState.FILE1_SHEET]
+        file2_name = st.session_state[SessionState.FILE2_NAME]
+        file2_sheet = st.session_state[SessionState.FILE2_SHEET]
         
         if device_type == 'mobile':
-            # モバイルでは縦並び
-            st.markdown(f"""
-            <div class="file-info-card">
-                <h4>📁 比較元</h4>
-                <p><strong>ファイル名:</strong> {st.session_state[SessionState.FILE1_NAME]}</p>
-                <p><strong>シート:</strong> {st.session_state[SessionState.FILE1_SHEET]}</p>
-            </div>
-            """, unsafe_allow_html=True)
-            
-            st.markdown(f"""
-            <div class="file-info-card">
-                <h4>📁 比較先</h4>
-                <p><strong>ファイル名:</strong> {st.session_state[SessionState.FILE2_NAME]}</p>
-                <p><strong>シート:</strong> {st.session_state[SessionState.FILE2_SHEET]}</p>
-            </div>
-            """, unsafe_allow_html=True)
+            # モバイルでは縦並び（2枚のカードを1回の出力にまとめる）
+            st.markdown(
+                render_file_info_card("比較元", file1_name, file1_sheet)
+                + render_file_info_card("比較先", file2_name, file2_sheet),
+                unsafe_allow_html=True
+            )
         else:
             # タブレット・デスクトップでは横並び
             col1, col2 = st.columns(2)
             with col1:
-                st.markdown(f"""
-                <div class="file-info-card">
-                    <h4>📁 ファイル1（比較元）</h4>
-                    <p><strong>ファイル名:</strong> {st.session_state[SessionState.FILE1_NAME]}</p>
-                    <p><strong>シート:</strong> {st.session_state[SessionState.FILE1_SHEET]}</p>
-                </div>
-                """, unsafe_allow_html=True)
+                st.markdown(render_file_info_card("ファイル1（比較元）", file1_name, file1_sheet), unsafe_allow_html=True)
             with col2:
-                st.markdown(f"""
-                <div class="file-info-card">
-                    <h4>📁 ファイル2（比較先）</h4>
-                    <p><strong>ファイル名:</strong> {st.session_state[SessionState.FILE2_NAME]}</p>
-                    <p><strong>シート:</strong> {st.session_state[SessionState.FILE2_SHEET]}</p>
-                </div>
-                """, unsafe_allow_html=True)
+                st.markdown(render_file_info_card("ファイル2（比較先）", file2_name, file2_sheet), unsafe_allow_html=True)
 
 def render_sidebar(comparison_completed: bool):
     """サイドバー表示"""
@@ -628,17 +777,12 @@ def render_sidebar(comparison_completed: bool):
             st.markdown("**比較キー:**")
             st.code("\n".join(CONFIG.KEY_COLUMNS), language="text")
         
-        st.markdown("---")
-        st.markdown("### 📥 ダウンロード設定")
+        st.markdown("---\n\n### 📥 ダウンロード設定")
         encoding = st.selectbox("文字コードを選択", ["UTF-8 (BOM付き)", "Shift_JIS"])
         
         # ダウンロードボタン
         if comparison_completed and SessionState.ALL_ITEMS in st.session_state:
-            csv_data = create_csv_data(
-                st.session_state[SessionState.ALL_ITEMS], 
-                st.session_state[SessionState.ORIGINAL_COLUMNS], 
-                encoding
-            )
+            csv_data = get_csv_data(encoding)
             st.download_button(
                 label="📥 CSVダウンロード",
                 data=csv_data,
@@ -649,10 +793,8 @@ def render_sidebar(comparison_completed: bool):
         else:
             st.button("📥 CSVダウンロード", disabled=True, use_container_width=True)
 
-def render_file_upload_section() -> Tuple[Optional[pd.DataFrame], Optional[pd.DataFrame], str, str, str, str]:
+def render_file_upload_section(device_type: str) -> Tuple[Optional[pd.DataFrame], Optional[pd.DataFrame], str, str, str, str]:
     """ファイルアップロードセクション表示"""
-    device_type = get_device_type()
-    
     if device_type == 'mobile':
         # モバイルでは縦並び
         st.subheader("📁 比較元")
@@ -680,15 +822,19 @@ def render_file_upload_section() -> Tuple[Optional[pd.DataFrame], Optional[pd.Da
     
     return data1, data2, file1_name, file1_sheet, file2_name, file2_sheet
 
-def render_pagination_controls(total_items: int, current_page: int, tab_key: str) -> int:
+def render_pagination_controls(total_items: int, tab_key: str, items_per_page: int) -> int:
     """ページング制御表示"""
-    items_per_page = get_items_per_page()
-    device_type = get_device_type()
-    
     if total_items <= items_per_page:
-        return current_page
+        return 1
     
-    total_pages, max_page, _, _ = get_page_info(total_items, items_per_page)
+    total_pages, _, _, _ = get_page_info(total_items, items_per_page)
+    
+    # ページ番号はselectboxのウィジェット状態として保持する（ボタン＋再実行による二重描画を避ける）
+    current_page = st.selectbox(
+        "ページ選択",
+        range(1, total_pages + 1),
+        key=f"page_select_{tab_key}"
+    )
     start_item, end_item = get_page_range(total_items, current_page, items_per_page)
     
     # ページング情報の表示
@@ -700,57 +846,81 @@ def render_pagination_controls(total_items: int, current_page: int, tab_key: str
     </div>
     """, unsafe_allow_html=True)
     
-    if device_type == 'mobile':
-        # モバイルでは縦並び
-        new_page = st.selectbox(
-            "ページ選択",
-            range(1, total_pages + 1),
-            index=current_page - 1,
-            key=f"page_select_{tab_key}"
-        )
-        
-        col1, col2 = st.columns(2)
-        with col1:
-            if st.button("◀️ 前のページ", key=f"prev_{tab_key}", disabled=(current_page == 1), use_container_width=True):
-                new_page = max(1, current_page - 1)
-        
-        with col2:
-            if st.button("▶️ 次のページ", key=f"next_{tab_key}", disabled=(current_page == total_pages), use_container_width=True):
-                new_page = min(total_pages, current_page + 1)
+    return current_page
+
+def build_page_df(page_items: pd.DataFrame, columns: List[str]) -> pd.DataFrame:
+    """ページ表示用DataFrame作成"""
+    display_columns = {
+        '変更タイプ': page_items[ResultColumn.TYPE].cat.rename_categories(CONFIG.TYPE_DISPLAY_MAP).array,
+        '在庫(元)': page_items[ResultColumn.STOCK1_FMT].to_numpy(),
+        '在庫(先)': page_items[ResultColumn.STOCK2_FMT].to_numpy(),
+        '在庫変化': page_items[ResultColumn.CHANGE_FMT].to_numpy()
+    }
+    
+    # 元の列データを追加（列単位で参照し、セルごとの辞書参照はしない）
+    for col in columns:
+        display_columns[col] = page_items[col].to_numpy() if col in page_items.columns else ''
+    
+    return pd.DataFrame(display_columns)
+
+@st.fragment
+def render_result_tab(items: pd.DataFrame, columns: List[str], filter_type: str,
+                      type_indices: Dict[str, np.ndarray], device_type: str, items_per_page: int):
+    """タブ内の結果表示（ページ切り替え時はこの部分のみ再実行）"""
+    # 比較時に作成した行位置で絞り込む（タブごとの全件走査・全件コピーはしない）
+    if filter_type == "all":
+        row_positions = np.arange(len(items))
     else:
-        # タブレット・デスクトップでは横並び
-        col1, col2, col3, col4, col5 = st.columns(5)
-        
-        with col1:
-            if st.button("⏮️ 最初", key=f"first_{tab_key}", disabled=(current_page == 1)):
-                new_page = 1
-        
-        with col2:
-            if st.button("◀️ 前", key=f"prev_{tab_key}", disabled=(current_page == 1)):
-                new_page = max(1, current_page - 1)
-        
-        with col3:
-            new_page = st.selectbox(
-                "ページ",
-                range(1, total_pages + 1),
-                index=current_page - 1,
-                key=f"page_select_{tab_key}",
-                label_visibility="collapsed"
-            )
-        
-        with col4:
-            if st.button("▶️ 次", key=f"next_{tab_key}", disabled=(current_page == total_pages)):
-                new_page = min(total_pages, current_page + 1)
-        
-        with col5:
-            if st.button("⏭️ 最後", key=f"last_{tab_key}", disabled=(current_page == total_pages)):
-                new_page = total_pages
+        row_positions = type_indices[filter_type]
+    
+    total_items = len(row_positions)
+    if total_items == 0:
+        st.info("該当するアイテムはありません")
+        return
+    
+    # ページング制御（件数が少なければページングせず、スクロールは表側で処理させる）
+    if total_items <= CONFIG.NATIVE_DATAFRAME_LIMIT:
+        current_page, items_per_page = 1, total_items
+    else:
+        current_page = render_pagination_controls(total_items, filter_type, items_per_page)
+    
+    # 現在ページの行位置のみ取り出してからアイテムを取得
+    page_items = items.take(get_page_items(row_positions, current_page, items_per_page))
+    
+    if page_items.empty:
+        st.info("このページには表示するアイテムがありません")
+        return
     
-    return new_page
+    # 表示データの準備（表示するページ分のみ作成）
+    df = build_page_df(page_items, columns)
+    
+    # デバイスタイプに応じた表示調整
+    height = 400 if device_type == 'mobile' else min(600, len(df) * 35 + 38)
+    
+    # スタイル適用したDataFrameを表示
+    def highlight_negative_change(val):
+        """在庫変化が負の値の場合に赤色にする"""
+        if isinstance(val, str) and val.startswith('-'):
+            return 'color: red'
+        return ''
+    
+    styled_df = df.style.applymap(highlight_negative_change, subset=['在庫変化'])
+    
+    st.dataframe(
+        styled_df, 
+        use_container_width=True, 
+        hide_index=True, 
+        height=height
+    )
+    
+    # 現在の表示情報
+    start_item, end_item = get_page_range(total_items, current_page, items_per_page)
+    st.caption(f"現在のページ: {start_item:,} - {end_item:,} 件 / 全 {total_items:,} 件")
 
-def render_results(items: List[ComparisonItem], columns: List[str], summary: ComparisonSummary):
+def render_results(items: pd.DataFrame, columns: List[str], summary: ComparisonSummary,
+                   type_indices: Dict[str, np.ndarray], device_type: str, items_per_page: int):
     """結果表示"""
-    if not items:
+    if items.empty:
         st.info("🎉 比較対象のアイテムが見つかりませんでした")
         return
     
@@ -769,83 +939,7 @@ def render_results(items: List[ComparisonItem], columns: List[str], summary: Com
     
     for tab, (_, filter_type) in zip(tabs, tab_configs):
         with tab:
-            if filter_type == "all":
-                filtered_items = items
-            else:
-                filtered_items = [item for item in items if item.type == filter_type]
-            
-            if not filtered_items:
-                st.info("該当するアイテムはありません")
-                continue
-            
-            # ページング状態の管理
-            page_key = f"page_{filter_type}"
-            if page_key not in st.session_state:
-                st.session_state[page_key] = 1
-            
-            # ページング制御
-            current_page = render_pagination_controls(
-                len(filtered_items), 
-                st.session_state[page_key], 
-                filter_type
-            )
-            
-            # ページが変更された場合は更新
-            if current_page != st.session_state[page_key]:
-                st.session_state[page_key] = current_page
-                st.rerun()
-            
-            # 現在ページのアイテムを取得
-            page_items = get_page_items(filtered_items, current_page)
-            
-            if not page_items:
-                st.info("このページには表示するアイテムがありません")
-                continue
-            
-            # 表示データの準備
-            display_data = []
-            for item in page_items:
-                stock1_display, stock2_display, stock_change_display = format_stock_display(item)
-                
-                row = {
-                    '変更タイプ': CONFIG.TYPE_DISPLAY_MAP[item.type],
-                    '在庫(元)': stock1_display,
-                    '在庫(先)': stock2_display,
-                    '在庫変化': stock_change_display
-                }
-                
-                # 元の列データを追加
-                for col in columns:
-                    row[col] = item.data.get(col, '')
-                
-                display_data.append(row)
-            
-            df = pd.DataFrame(display_data)
-            
-            # デバイスタイプに応じた表示調整
-            device_type = get_device_type()
-            height = 400 if device_type == 'mobile' else min(600, len(df) * 35 + 38)
-            
-            # スタイル適用したDataFrameを表示
-            def highlight_negative_change(val):
-                """在庫変化が負の値の場合に赤色にする"""
-                if isinstance(val, str) and val.startswith('-'):
-                    return 'color: red'
-                return ''
-            
-            styled_df = df.style.applymap(highlight_negative_change, subset=['在庫変化'])
-            
-            st.dataframe(
-                styled_df, 
-                use_container_width=True, 
-                hide_index=True, 
-                height=height
-            )
-            
-            # 現在の表示情報
-            items_per_page = get_items_per_page()
-            start_item, end_item = get_page_range(len(filtered_items), current_page, items_per_page)
-            st.caption(f"現在のページ: {start_item:,} - {end_item:,} 件 / 全 {len(filtered_items):,} 件")
+            render_result_tab(items, columns, filter_type, type_indices, device_type, items_per_page)
 
 # =============================================================================
 # メインアプリケーション
@@ -873,7 +967,15 @@ def handle_comparison_execution(comparator: InventoryComparator, data1: pd.DataF
     if st.button("🔍 比較実行", type="primary", use_container_width=True):
         with st.spinner("比較処理を実行中..."):
             try:
-                items, summary = comparator.compare(data1, data2)
+                # 大量割り当て中に循環GCが走らないよう、比較処理の間だけ自動GCを停止する
+                gc_was_enabled = gc.isenabled()
+                gc.disable()
+                try:
+                    items, summary = comparator.compare(data1, data2)
+                finally:
+                    if gc_was_enabled:
+                        gc.enable()
+                        gc.collect()
                 
                 # 結果を保存
                 SessionState.save_comparison_result(
@@ -895,17 +997,21 @@ def main():
     SessionState.initialize()
     
     # 比較エンジン初期化
-    comparator = InventoryComparator()
+    comparator = get_comparator()
+    
+    # デバイス依存のレイアウト値は再実行中に変わらないため、ここで一度だけ決定する
+    device_type = get_device_type()
+    items_per_page = get_items_per_page(device_type)
     
     # UI描画
     comparison_completed = st.session_state[SessionState.COMPARISON_COMPLETED]
-    render_header(comparison_completed)
+    render_header(comparison_completed, device_type)
     render_sidebar(comparison_completed)
     
     # メインコンテンツ
     if not comparison_completed:
         # ファイルアップロードと比較実行
-        data1, data2, file1_name, file1_sheet, file2_name, file2_sheet = render_file_upload_section()
+        data1, data2, file1_name, file1_sheet, file2_name, file2_sheet = render_file_upload_section(device_type)
         
         if data1 is not None and data2 is not None:
             handle_comparison_execution(comparator, data1, data2, file1_name, file1_sheet, file2_name, file2_sheet)
@@ -919,7 +1025,10 @@ def main():
         render_results(
             st.session_state[SessionState.ALL_ITEMS], 
             st.session_state[SessionState.ORIGINAL_COLUMNS], 
-            st.session_state[SessionState.SUMMARY]
+            st.session_state[SessionState.SUMMARY],
+            st.session_state[SessionState.TYPE_INDICES],
+            device_type,
+            items_per_page
         )
 
 if __name__ == "__main__":